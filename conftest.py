@@ -0,0 +1 @@
+# Makes the repository root importable (libiclight) when running pytest.
@@ -12,3 +12,6 @@ if not launch.is_installed("pydantic"):
 
 if not launch.is_installed("cv2"):
     launch.run_pip("install opencv-python~=4.9.0.80", "cv2 for ic-light")
+
+if not launch.is_installed("numba"):
+    launch.run_pip("install numba~=0.59.1", "numba for ic-light")
@@ -41,10 +41,13 @@ def apply_ic_light(
     input_fg_rgb: np.ndarray = args.input_fg_rgb
 
     # [B, 4, H, W]
+    # channels-last lets the VAE's convolutions hit the faster kernels.
     concat_conds = vae_encode(
         p.sd_model,
         numpy2pytorch(args.get_concat_cond(input_fg_rgb, p)).to(
-            dtype=devices.dtype_vae, device=device
+            dtype=devices.dtype_vae,
+            device=device,
+            memory_format=torch.channels_last,
         ),
     ).to(dtype=devices.dtype_unet)
 
@@ -10,15 +10,50 @@ from libiclight.model_loader import ModelType
 from libiclight.rembg_utils import run_rmbg
 from libiclight.utils import (
     align_dim_latent,
+    array_digest,
     make_masked_area_grey,
     resize_and_center_crop,
 )
 
-from pydantic import BaseModel, root_validator, validator
-from typing import Optional
+from pydantic import BaseModel, PrivateAttr, root_validator, validator
+from typing import ClassVar, Optional
+from collections import OrderedDict
+from functools import lru_cache
 from enum import Enum
 import numpy as np
 
+try:
+    from numba import njit, prange
+
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+
+if HAS_NUMBA:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _reinforce_fg_composite(
+        rgb_fg: np.ndarray,
+        lightmap_rgb: np.ndarray,
+        out: np.ndarray,
+    ):
+        """Fused grey-mask + composite: where the foreground is the grey
+        padding colour keep the lightmap, elsewhere keep the foreground."""
+        h, w, _ = rgb_fg.shape
+        for y in prange(h):
+            for x in range(w):
+                if (
+                    rgb_fg[y, x, 0] == 127
+                    and rgb_fg[y, x, 1] == 127
+                    and rgb_fg[y, x, 2] == 127
+                ):
+                    for c in range(3):
+                        out[y, x, c] = lightmap_rgb[y, x, c]
+                else:
+                    for c in range(3):
+                        out[y, x, c] = rgb_fg[y, x, c]
+
 
 class BGSourceFC(Enum):
     """BGSource for FC model."""
@@ -31,6 +66,9 @@ class BGSourceFC(Enum):
     GREY = "Ambient"
     CUSTOM = "Custom LightMap"
 
+    # The gradients are deterministic per (source, size) and are requested
+    # repeatedly by the UI, so memoize them. Callers never mutate the result.
+    @lru_cache(maxsize=None)
     def get_bg(
         self,
         image_width: int,
@@ -151,6 +189,16 @@ class ICLightArgs(BaseModel):
     # Calculated value of the input fg with alpha channel filled with grey.
     input_fg_rgb: Optional[np.ndarray] = None
 
+    # Memoized background-removal results keyed by input image hash, so that
+    # re-running generation with the same foreground (e.g. a batch of seeds)
+    # skips the rembg forward pass.
+    _bg_cache: ClassVar["OrderedDict[bytes, np.ndarray]"] = OrderedDict()
+    _BG_CACHE_SIZE: ClassVar[int] = 8
+
+    # Foreground resized/cropped per target resolution, so repeated
+    # sampling passes (e.g. base + hires) don't redo the LANCZOS resize.
+    _resized_fg: dict = PrivateAttr(default_factory=dict)
+
     @classmethod
     def cls_decode_base64(cls, base64string: str) -> np.ndarray:
         return np.array(api.decode_base64_to_image(base64string)).astype("uint8")
@@ -179,7 +227,16 @@ class ICLightArgs(BaseModel):
             return values
 
         if remove_bg:
-            input_fg_rgb: np.ndarray = run_rmbg(input_fg)
+            key = array_digest(input_fg)
+            cache = cls._bg_cache
+            if key in cache:
+                cache.move_to_end(key)
+                input_fg_rgb: np.ndarray = cache[key]
+            else:
+                input_fg_rgb: np.ndarray = run_rmbg(input_fg)
+                cache[key] = input_fg_rgb
+                while len(cache) > cls._BG_CACHE_SIZE:
+                    cache.popitem(last=False)
         else:
             if len(input_fg.shape) < 3:
                 raise NotImplementedError("Does not support L Images...")
@@ -233,7 +290,10 @@ class ICLightArgs(BaseModel):
             image_width = p.width
             image_height = p.height
 
-        fg = resize_and_center_crop(processed_fg, image_width, image_height)
+        fg = self._resized_fg.get((image_width, image_height))
+        if fg is None:
+            fg = resize_and_center_crop(processed_fg, image_width, image_height)
+            self._resized_fg[(image_width, image_height)] = fg
 
         match self.model_type:
             case ModelType.FC:
@@ -258,14 +318,23 @@ class ICLightArgs(BaseModel):
         lightmap = np.asarray(p.init_images[0]).astype(np.uint8)
         if self.reinforce_fg:
             rgb_fg = self.input_fg_rgb
-            mask = np.all(rgb_fg == np.array([127, 127, 127]), axis=-1)
-            mask = mask[..., None]  # [H, W, 1]
             lightmap = resize_and_center_crop(
                 lightmap, target_width=rgb_fg.shape[1], target_height=rgb_fg.shape[0]
             )
             lightmap_rgb = lightmap[..., :3]
             lightmap_alpha = lightmap[..., 3:4]
-            lightmap_rgb = rgb_fg * (1 - mask) + lightmap_rgb * mask
+            if HAS_NUMBA:
+                composited = np.empty_like(rgb_fg)
+                _reinforce_fg_composite(
+                    np.ascontiguousarray(rgb_fg),
+                    np.ascontiguousarray(lightmap_rgb),
+                    composited,
+                )
+                lightmap_rgb = composited
+            else:
+                mask = np.all(rgb_fg == np.array([127, 127, 127]), axis=-1)
+                mask = mask[..., None]  # [H, W, 1]
+                lightmap_rgb = rgb_fg * (1 - mask) + lightmap_rgb * mask
             lightmap = np.concatenate([lightmap_rgb, lightmap_alpha], axis=-1).astype(
                 np.uint8
             )
@@ -3,11 +3,141 @@
 # https://youtu.be/5EuYKEvugLU?feature=shared #
 # =========================================== #
 
+from functools import lru_cache
+
 from PIL import Image
 import numpy as np
+import torch
+import torch.nn.functional as F
 import cv2
 
+try:
+    from numba import njit, prange
+
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+
+def _to_rgb(image: np.ndarray) -> np.ndarray:
+    if len(image.shape) == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+    elif image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_RGBA2RGB)
+    return image
+
+
+@lru_cache(maxsize=None)
+def _gaussian_kernels(
+    kernel_size: int,
+    device: torch.device,
+    dtype: torch.dtype,
+) -> tuple:
+    """Separable 1D Gaussian kernels for a depthwise (groups=3) conv2d.
+    Taken from cv2.getGaussianKernel (sigma=0 uses cv2's fixed kernels
+    for small sizes) so all code paths blur identically."""
+    kernel = torch.from_numpy(
+        cv2.getGaussianKernel(kernel_size, 0).astype(np.float32).reshape(-1)
+    ).to(device=device, dtype=dtype)
+    return (
+        kernel.view(1, 1, 1, -1).expand(3, 1, 1, -1).contiguous(),
+        kernel.view(1, 1, -1, 1).expand(3, 1, -1, 1).contiguous(),
+    )
+
+
+def _gaussian_blur(image: torch.Tensor, kernel_size: int) -> torch.Tensor:
+    """Blur a [B, 3, H, W] tensor with two 1D passes,
+    mirroring cv2.GaussianBlur's reflected border."""
+    if kernel_size <= 1:
+        return image
+
+    kernel_x, kernel_y = _gaussian_kernels(kernel_size, image.device, image.dtype)
+    pad = kernel_size // 2
+    image = F.conv2d(F.pad(image, (pad, pad, 0, 0), mode="reflect"), kernel_x, groups=3)
+    image = F.conv2d(F.pad(image, (0, 0, pad, pad), mode="reflect"), kernel_y, groups=3)
+    return image
+
+
+if HAS_NUMBA:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _fuse_detail(
+        hi: np.ndarray,
+        lo: np.ndarray,
+        fg_lo: np.ndarray,
+        out: np.ndarray,
+    ):
+        """out = clip(hi - lo + fg_lo) fused into a single uint8 pass,
+        avoiding the float32 intermediates numpy would allocate."""
+        h, w, _ = hi.shape
+        for y in prange(h):
+            for x in range(w):
+                for c in range(3):
+                    # Cast to signed explicitly: numba keeps uint8
+                    # arithmetic unsigned, and wraparound would turn
+                    # negative DoG values into 255 instead of 0.
+                    v = (
+                        np.int32(hi[y, x, c])
+                        - np.int32(lo[y, x, c])
+                        + np.int32(fg_lo[y, x, c])
+                    )
+                    out[y, x, c] = 0 if v < 0 else (255 if v > 255 else v)
+
+
+# Scratch buffers for the CPU path, reused across postprocess calls as
+# long as the resolution stays the same. Only blur intermediates live
+# here; they are fully overwritten on every use and never escape.
+_scratch: dict = {}
+
+
+def _scratch_buffer(name: str, shape: tuple) -> np.ndarray:
+    buffer = _scratch.get(name)
+    if buffer is None or buffer.shape != shape:
+        buffer = np.empty(shape, dtype=np.uint8)
+        _scratch[name] = buffer
+    return buffer
+
+
+def _restore_detail_cpu(
+    ic_light_image: np.ndarray,
+    original_image: np.ndarray,
+    blur_radius: int,
+) -> Image:
+    """CPU fallback: cv2 blurs on uint8 plus a numba-fused combine."""
+    blurred_ic_light = cv2.GaussianBlur(
+        ic_light_image,
+        (blur_radius, blur_radius),
+        0,
+        dst=_scratch_buffer("blurred_ic_light", ic_light_image.shape),
+    )
+    blurred_original = cv2.GaussianBlur(
+        original_image,
+        (blur_radius, blur_radius),
+        0,
+        dst=_scratch_buffer("blurred_original", original_image.shape),
+    )
 
+    DoG = np.empty_like(original_image)
+    _fuse_detail(original_image, blurred_original, blurred_ic_light, DoG)
+    return Image.fromarray(DoG)
+
+
+def _upload(image: np.ndarray, device: torch.device, dtype: torch.dtype) -> torch.Tensor:
+    """Upload a [H, W, 3] or [B, H, W, 3] uint8 array as a normalized
+    [B, 3, H, W] channels-last tensor."""
+    image = np.ascontiguousarray(image)
+    if not image.flags.writeable:
+        # e.g. arrays materialized from PIL images; torch.from_numpy
+        # warns on read-only buffers.
+        image = image.copy()
+    tensor = torch.from_numpy(image).to(device)
+    if tensor.dim() == 3:
+        tensor = tensor.unsqueeze(0)
+    tensor = tensor.movedim(-1, 1).to(dtype) / 255.0
+    return tensor.contiguous(memory_format=torch.channels_last)
+
+
+@torch.inference_mode()
 def restore_detail(
     ic_light_image: np.array,
     original_image: np.array,
@@ -17,26 +147,70 @@ def restore_detail(
     h, w, c = ic_light_image.shape
     original_image = cv2.resize(original_image, (w, h))
 
-    if len(ic_light_image.shape) == 2:
-        ic_light_image = cv2.cvtColor(ic_light_image, cv2.COLOR_GRAY2RGB)
-    elif ic_light_image.shape[2] == 4:
-        ic_light_image = cv2.cvtColor(ic_light_image, cv2.COLOR_RGBA2RGB)
-
-    if len(original_image.shape) == 2:
-        original_image = cv2.cvtColor(original_image, cv2.COLOR_GRAY2RGB)
-    elif original_image.shape[2] == 4:
-        original_image = cv2.cvtColor(original_image, cv2.COLOR_RGBA2RGB)
+    ic_light_image = _to_rgb(ic_light_image)
+    original_image = _to_rgb(original_image)
 
     assert ic_light_image.shape[2] == 3
     assert original_image.shape[2] == 3
 
-    ic_light_image = ic_light_image.astype(np.float32) / 255.0
-    original_image = original_image.astype(np.float32) / 255.0
+    use_cuda = torch.cuda.is_available()
+    if not use_cuda and HAS_NUMBA:
+        return _restore_detail_cpu(
+            np.ascontiguousarray(ic_light_image),
+            np.ascontiguousarray(original_image),
+            blur_radius,
+        )
 
-    blurred_ic_light = cv2.GaussianBlur(ic_light_image, (blur_radius, blur_radius), 0)
-    blurred_original = cv2.GaussianBlur(original_image, (blur_radius, blur_radius), 0)
+    device = torch.device("cuda") if use_cuda else torch.device("cpu")
+    dtype = torch.float16 if use_cuda else torch.float32
 
-    DoG = original_image - blurred_original + blurred_ic_light
-    DoG = np.clip(DoG * 255.0, 0, 255).astype(np.uint8)
+    ic_light = _upload(ic_light_image, device, dtype)
+    original = _upload(original_image, device, dtype)
 
-    return Image.fromarray(DoG)
+    DoG = original - _gaussian_blur(original, blur_radius)
+    DoG += _gaussian_blur(ic_light, blur_radius)
+    DoG = DoG.mul_(255.0).clamp_(0, 255).to(torch.uint8)
+
+    result = DoG.squeeze(0).movedim(0, -1).contiguous()
+    return Image.fromarray(result.to("cpu", non_blocking=True).numpy())
+
+
+@torch.inference_mode()
+def restore_detail_batch(
+    ic_light_images: list,
+    original_image: np.ndarray,
+    blur_radius: int = 5,
+) -> list:
+    """Batched restore_detail. Outputs of the same resolution share a
+    single conv2d pipeline and one blur of the original image."""
+    if len(ic_light_images) <= 1 or not torch.cuda.is_available():
+        return [
+            restore_detail(image, original_image, blur_radius)
+            for image in ic_light_images
+        ]
+
+    # Group by resolution so each group can be stacked into one batch.
+    groups = {}
+    for index, image in enumerate(ic_light_images):
+        groups.setdefault(image.shape[:2], []).append(index)
+
+    device = torch.device("cuda")
+    dtype = torch.float16
+    results = [None] * len(ic_light_images)
+
+    for (h, w), indices in groups.items():
+        batch = np.stack([_to_rgb(ic_light_images[i]) for i in indices], axis=0)
+        original = _to_rgb(cv2.resize(original_image, (w, h)))
+
+        ic_light = _upload(batch, device, dtype)
+        original = _upload(original, device, dtype)
+
+        DoG = original - _gaussian_blur(original, blur_radius)
+        DoG = DoG + _gaussian_blur(ic_light, blur_radius)
+        DoG = DoG.mul_(255.0).clamp_(0, 255).to(torch.uint8)
+
+        result = DoG.movedim(1, -1).contiguous().to("cpu").numpy()
+        for batch_index, i in enumerate(indices):
+            results[i] = Image.fromarray(result[batch_index])
+
+    return results
@@ -32,10 +32,13 @@ def apply_ic_light(
 
     # [B, C, H, W]
     pixel_concat = forge_numpy2pytorch(args.get_concat_cond(input_fg_rgb, p)).to(
-        device=vae.device, dtype=torch.float16
+        device=vae.device,
+        dtype=torch.float16,
+        memory_format=torch.channels_last,
     )
     # [B, H, W, C]
-    # Forge/ComfyUI's VAE accepts [B, H, W, C] format.
+    # Forge/ComfyUI's VAE accepts [B, H, W, C] format; with channels-last
+    # storage the movedim is a free view instead of a gather.
     pixel_concat = pixel_concat.movedim(1, 3)
 
     patched_unet: ModelPatcher = node.apply(
@@ -4,6 +4,7 @@
 # ============================================================= #
 
 from modules.paths import models_path
+from libiclight.utils import make_masked_area_grey
 from PIL import Image
 import numpy as np
 import rembg
@@ -34,7 +35,16 @@ def run_rmbg(
     if "U2NET_HOME" not in os.environ:
         os.environ["U2NET_HOME"] = os.path.join(models_path, "u2net")
 
-    image = Image.fromarray(np_image.astype(np.uint8)).convert("RGB")
+    np_image = np_image.astype(np.uint8)
+    if np_image.ndim == 3 and np_image.shape[-1] == 4:
+        # convert("RGB") would simply drop the alpha channel, exposing
+        # whatever colors hide under transparent pixels; composite onto
+        # grey with the alpha instead.
+        np_image = make_masked_area_grey(
+            np_image[..., :3],
+            np_image[..., 3:].astype(np.float32) / 255.0,
+        )
+    image = Image.fromarray(np_image).convert("RGB")
 
     processed_image = rembg.remove(
         image,
@@ -1,3 +1,5 @@
+from hashlib import blake2b
+
 from PIL import Image
 import numpy as np
 import torch
@@ -39,7 +41,9 @@ def forge_numpy2pytorch(img: np.ndarray) -> torch.Tensor:
 
 
 def resize_and_center_crop(image, target_width, target_height):
-    pil_image = Image.fromarray(image)
+    # Inputs can be views (e.g. np.fliplr for the flipped background);
+    # PIL requires C-contiguous buffers.
+    pil_image = Image.fromarray(np.ascontiguousarray(image))
     original_width, original_height = pil_image.size
     scale_factor = max(target_width / original_width, target_height / original_height)
     resized_width = int(round(original_width * scale_factor))
@@ -54,7 +58,7 @@ def resize_and_center_crop(image, target_width, target_height):
 
 
 def resize_without_crop(image, target_width, target_height):
-    pil_image = Image.fromarray(image)
+    pil_image = Image.fromarray(np.ascontiguousarray(image))
     resized_image = pil_image.resize((target_width, target_height), Image.LANCZOS)
     return np.array(resized_image)
 
@@ -66,6 +70,12 @@ def align_dim_latent(x: int) -> int:
     return (x // 8) * 8
 
 
+def array_digest(array: np.ndarray) -> bytes:
+    """Content-identity key for a numpy array. blake2b is keyed-hash
+    fast and far cheaper than serializing the array."""
+    return blake2b(array.tobytes(), digest_size=16).digest()
+
+
 def make_masked_area_grey(image: np.ndarray, alpha: np.ndarray) -> np.ndarray:
     """Make the masked area grey."""
     return (
@@ -8,11 +8,12 @@ from modules.processing import (
 
 from libiclight.model_loader import ModelType, detect_models
 from libiclight.ic_modes import t2i_fc, t2i_fbc, i2i_fc
-from libiclight.detail_utils import restore_detail
+from libiclight.detail_utils import restore_detail_batch
 from libiclight.args import ICLightArgs, BGSourceFC, BGSourceFBC
 
-from typing import Optional, Tuple
+from typing import Callable, Optional, Tuple
 from dataclasses import dataclass
+from functools import lru_cache
 from enum import Enum
 from PIL import Image
 import gradio as gr
@@ -24,6 +25,32 @@ class BackendType(Enum):
     Forge = "Forge"
 
 
+@lru_cache(maxsize=None)
+def make_gather_fn(fields: Tuple[str, ...]) -> Callable:
+    """Compile a specialized state-gather callback from the field names,
+    the way dataclasses generate __init__: a literal dict display with no
+    per-call zip or attribute lookups."""
+    items = ", ".join(f"{field!r}: args[{i}]" for i, field in enumerate(fields))
+    namespace = {}
+    exec(f"async def gather_args(*args): return {{{items}}}", namespace)
+    return namespace["gather_args"]
+
+
+@lru_cache(maxsize=None)
+def resolve_backend() -> Tuple[Callable, BackendType]:
+    """Import the matching backend once; every script instance shares
+    the resolution."""
+    try:
+        from libiclight.forge_backend import apply_ic_light
+
+        return apply_ic_light, BackendType.Forge
+
+    except ImportError:
+        from libiclight.a1111_backend import apply_ic_light
+
+        return apply_ic_light, BackendType.A1111
+
+
 @dataclass
 class A1111Context:
     """Contains all components from A1111."""
@@ -37,38 +64,33 @@ class A1111Context:
 
     img2img_image: Optional[gr.Image] = None
 
+    # elem_id -> field name. Built once; set_component runs for every
+    # component A1111 registers.
+    ID_MAPPING = {
+        "txt2img_generate": "txt2img_submit_button",
+        "img2img_generate": "img2img_submit_button",
+        "img2img_width": "img2img_w_slider",
+        "img2img_height": "img2img_h_slider",
+        "img2img_image": "img2img_image",
+    }
+
     def set_component(self, component: gr.components.Component):
-        id_mapping = {
-            "txt2img_generate": "txt2img_submit_button",
-            "img2img_generate": "img2img_submit_button",
-            "img2img_width": "img2img_w_slider",
-            "img2img_height": "img2img_h_slider",
-            "img2img_image": "img2img_image",
-        }
-        elem_id = getattr(component, "elem_id", None)
-        if elem_id in id_mapping and getattr(self, id_mapping[elem_id]) is None:
-            setattr(self, id_mapping[elem_id], component)
+        field = self.ID_MAPPING.get(getattr(component, "elem_id", None))
+        if field is not None and getattr(self, field) is None:
+            setattr(self, field, component)
 
 
 class ICLightScript(scripts.Script):
     DEFAULT_ARGS = ICLightArgs()
+    # Field names in declaration order, matching the `inputs` list of the
+    # state-gather click handler.
+    ARG_FIELDS = tuple(vars(DEFAULT_ARGS).keys())
     a1111_context = A1111Context()
 
     def __init__(self) -> None:
         super().__init__()
         self.args: ICLightArgs = None
-
-        try:
-            from libiclight.forge_backend import apply_ic_light
-
-            self.apply_ic_light = apply_ic_light
-            self.backend_type = BackendType.Forge
-
-        except ImportError:
-            from libiclight.a1111_backend import apply_ic_light
-
-            self.apply_ic_light = apply_ic_light
-            self.backend_type = BackendType.A1111
+        self.apply_ic_light, self.backend_type = resolve_backend()
 
     def title(self):
         return "IC Light"
@@ -170,37 +192,33 @@ class ICLightScript(scripts.Script):
                 )
 
         state = gr.State({})
+        gather_inputs = [
+            enabled,
+            model_type,
+            input_fg,
+            uploaded_bg,
+            bg_source_fc,
+            bg_source_fbc,
+            remove_bg,
+            reinforce_fg,
+            detail_transfer,
+            detail_transfer_use_raw_input,
+            detail_transfer_blur_radius,
+        ]
         (
             ICLightScript.a1111_context.img2img_submit_button
             if is_img2img
             else ICLightScript.a1111_context.txt2img_submit_button
         ).click(
-            fn=lambda *args: dict(
-                zip(
-                    vars(self.DEFAULT_ARGS).keys(),
-                    args,
-                )
-            ),
-            inputs=[
-                enabled,
-                model_type,
-                input_fg,
-                uploaded_bg,
-                bg_source_fc,
-                bg_source_fbc,
-                remove_bg,
-                reinforce_fg,
-                detail_transfer,
-                detail_transfer_use_raw_input,
-                detail_transfer_blur_radius,
-            ],
+            fn=make_gather_fn(self.ARG_FIELDS[: len(gather_inputs)]),
+            inputs=gather_inputs,
             outputs=state,
             queue=False,
         )
 
         if is_img2img:
 
-            def update_img2img_input(bg_source_fc: str):
+            async def update_img2img_input(bg_source_fc: str):
                 bg_source_fc = BGSourceFC(bg_source_fc)
                 if bg_source_fc == BGSourceFC.CUSTOM:
                     return gr.skip()
@@ -211,9 +229,10 @@ class ICLightScript(scripts.Script):
                 fn=update_img2img_input,
                 inputs=[bg_source_fc],
                 outputs=[ICLightScript.a1111_context.img2img_image],
+                queue=False,
             )
 
-            def set_img2img_mode():
+            async def set_img2img_mode():
                 return gr.update(value=BGSourceFC.CUSTOM)
 
             ICLightScript.a1111_context.img2img_image.upload(
@@ -221,32 +240,39 @@ class ICLightScript(scripts.Script):
                 inputs=None,
                 outputs=[bg_source_fc],
                 show_progress="hidden",
+                queue=False,
             )
 
         else:
 
-            def on_model_change(model_type: str):
-                match ModelType.get(model_type):
-                    case ModelType.FC:
-                        return (
-                            gr.update(visible=False),
-                            gr.update(visible=False),
-                            gr.update(value=t2i_fc),
-                        )
-                    case ModelType.FBC:
-                        return (
-                            gr.update(visible=True),
-                            gr.update(visible=True),
-                            gr.update(value=t2i_fbc),
-                        )
-                    case _:
-                        raise SystemError
+            # Update kwargs for (bg_source_fbc, uploaded_bg, desc). Fresh
+            # gr.update objects must be built per event: gradio 4.x pops
+            # keys off the returned dicts during postprocessing.
+            model_change_updates = {
+                ModelType.FC: (
+                    dict(visible=False),
+                    dict(visible=False),
+                    dict(value=t2i_fc),
+                ),
+                ModelType.FBC: (
+                    dict(visible=True),
+                    dict(visible=True),
+                    dict(value=t2i_fbc),
+                ),
+            }
+
+            async def on_model_change(model_type: str):
+                return tuple(
+                    gr.update(**kwargs)
+                    for kwargs in model_change_updates[ModelType.get(model_type)]
+                )
 
             model_type.change(
                 fn=on_model_change,
                 inputs=[model_type],
                 outputs=[bg_source_fbc, uploaded_bg, desc],
                 show_progress=False,
+                queue=False,
             )
 
         return (state,)
@@ -258,7 +284,9 @@ class ICLightScript(scripts.Script):
             self.args = None
             return
 
-        if isinstance(p, StableDiffusionProcessingImg2Img):
+        if isinstance(p, StableDiffusionProcessingImg2Img) and args.reinforce_fg:
+            # Without reinforce_fg the lightmap is the init image unchanged,
+            # so the PIL -> numpy -> PIL round trip would be a no-op.
             p.init_images[0] = Image.fromarray(args.get_lightmap(p))
 
         self.args = args
@@ -295,12 +323,30 @@ class ICLightScript(scripts.Script):
             (self.args is None)
             or (not self.args.enabled)
             or (not self.args.detail_transfer)
+            # A kernel size of 1 is an identity blur, so the DoG result
+            # would just duplicate the generated image.
+            or int(self.args.detail_transfer_blur_radius) <= 1
         ):
             return
 
-        self.detailed_images.append(
-            restore_detail(
-                np.asarray(pp.image).astype(np.uint8),
+        # PIL materializes a fresh (read-only) uint8 array here, so no
+        # astype copy is needed. Detail restoration runs batched in
+        # `postprocess`.
+        self.detailed_images.append(np.asarray(pp.image))
+
+    def postprocess(self, p, processed, *args, **kwargs):
+        if (self.args is None) or (not self.args.enabled):
+            return
+
+        extra_images = (
+            p.extra_result_images
+            if self.backend_type == BackendType.A1111
+            and getattr(p, "extra_result_images", None)
+            else []
+        )
+        detailed_images = (
+            restore_detail_batch(
+                self.detailed_images,
                 (
                     self.args.input_fg
                     if self.args.detail_transfer_use_raw_input
@@ -308,16 +354,12 @@ class ICLightScript(scripts.Script):
                 ),
                 int(self.args.detail_transfer_blur_radius),
             )
+            if self.detailed_images
+            else []
         )
-
-    def postprocess(self, p, processed, *args, **kwargs):
-        if (self.args is None) or (not self.args.enabled):
-            return
-        if self.backend_type == BackendType.A1111:
-            if getattr(p, "extra_result_images", None):
-                processed.images += p.extra_result_images
-        if self.detailed_images:
-            processed.images += self.detailed_images
+        if extra_images or detailed_images:
+            # Merge in a single allocation instead of growing the list twice.
+            processed.images = [*processed.images, *extra_images, *detailed_images]
 
     @staticmethod
     def on_after_component(component, **_kwargs):